@@ -1,13 +1,111 @@
 """
 Core chatbot logic - supports both local llama-cpp-python and cloud Together AI
 """
+import functools
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict, deque, namedtuple
+
 from config import (
-    MODEL_PATH, N_GPU_LAYERS, N_THREADS, N_CTX, N_BATCH,
+    MODEL_PATH, N_GPU_LAYERS, N_THREADS, N_CTX, N_BATCH, N_UBATCH,
     MAX_TOKENS, TEMPERATURE, TOP_P, REPEAT_PENALTY, MAX_HISTORY_TURNS,
-    USE_CLOUD_LLM, TOGETHER_API_KEY, TOGETHER_MODEL
+    USE_CLOUD_LLM, TOGETHER_API_KEY, TOGETHER_MODEL, LOG_LEVEL,
+    STREAM_FLUSH_CHARS, STREAM_FLUSH_INTERVAL,
+    EXACT_CACHE_ENABLED, EXACT_CACHE_SIZE, LLAMA_STATE_CACHE_MB
 )
 from prompts import SYSTEM_PROMPT
 from rag import DocumentStore
+from utils.retrieval import needs_retrieval
+from utils.streaming import coalesce_tokens
+
+logger = logging.getLogger(__name__)
+
+# Llama 3.1 turn boundaries, pre-encoded for building local prompts as bytes
+SYSTEM_HEADER = b"<|start_header_id|>system<|end_header_id|>\n\n"
+USER_HEADER = b"<|start_header_id|>user<|end_header_id|>\n\n"
+ASSISTANT_HEADER = b"<|start_header_id|>assistant<|end_header_id|>\n\n"
+EOT = b"<|eot_id|>"
+
+# Stop sequences. <|eot_id|> is also an end-of-generation token that llama.cpp
+# stops on by id; <|start_header_id|> catches the model opening a new turn.
+TOGETHER_STOP = ["<|eot_id|>"]
+LLAMA_STOP = ["<|eot_id|>", "<|start_header_id|>"]
+
+# Static start of every local prompt. System content always begins with
+# SYSTEM_PROMPT, so this prefix is shared by every request.
+LLAMA_SYSTEM_PREFIX = SYSTEM_HEADER + SYSTEM_PROMPT.encode("utf-8")
+
+# One user/assistant exchange in the conversation history. `messages` holds the
+# exchange in chat-API form, built once when the turn is recorded.
+Turn = namedtuple("Turn", ["user", "assistant", "messages"])
+
+# Everything chat() and chat_stream() need before generating: the model input,
+# its cache key, and a cached response if one was found
+PreparedRequest = namedtuple("PreparedRequest", ["prompt", "prompt_key", "rag_context", "cached"])
+
+# Tokenized prompt segments kept between turns: history turns, the system
+# block and a little headroom
+PROMPT_SEGMENT_CACHE_SIZE = 2 * MAX_HISTORY_TURNS + 4
+
+# Rendered user-context prompts kept for recently active users
+USER_CONTEXT_CACHE_SIZE = 16
+
+
+def _make_turn(user_message: str, response: str) -> Turn:
+    """Create a history turn with its API messages prebuilt."""
+    return Turn(user_message, response, (
+        {"role": "user", "content": user_message},
+        {"role": "assistant", "content": response}
+    ))
+
+
+@functools.lru_cache(maxsize=64)
+def _fact_label(fact_type: str) -> str:
+    """Return the display label for a fact type ("pain_point" -> "Pain Point")."""
+    return fact_type.replace("_", " ").title()
+
+
+def _prompt_facts(facts: dict) -> tuple:
+    """The (type, value) facts to show in the prompt, sorted by type.
+
+    get_user_context keeps one fact per type, so the list is already short;
+    sorting keeps the rendered text stable between requests.
+    """
+    return tuple(sorted(facts.items()))
+
+
+def _user_context_key(user_context: dict, potential_matches: list) -> tuple:
+    """Hashable snapshot of the fields _build_user_context_prompt reads.
+
+    Values are keyed by their text as rendered into the prompt, since
+    potential_matches comes from the client and may hold lists or dicts.
+    """
+    context_key = None
+    if user_context:
+        facts = user_context.get("facts")
+        context_key = (
+            bool(user_context.get("is_returning")),
+            str(user_context.get("name")),
+            str(user_context.get("last_summary")),
+            tuple(map(str, user_context.get("last_interests") or ())),
+            tuple((fact_type, str(value)) for fact_type, value in _prompt_facts(facts)) if facts else ()
+        )
+    matches_key = tuple(
+        (str(match.get("name")), str(match.get("last_topic", "general questions")))
+        for match in (potential_matches or [])[:3]
+    )
+    return context_key, matches_key
+
+
+def _prompt_key(prompt) -> bytes:
+    """Digest of a fully assembled prompt (chat messages or local prompt segments)."""
+    if isinstance(prompt[0], dict):
+        data = json.dumps(prompt, sort_keys=True).encode("utf-8")
+    else:
+        data = b"".join(prompt)
+    return hashlib.blake2b(data, digest_size=16).digest()
 
 
 class BlackskyChatbot:
@@ -16,13 +114,30 @@ class BlackskyChatbot:
     def __init__(self, use_rag: bool = True):
         self.model = None
         self.client = None  # Together AI client
-        self.conversation_history = []
+        # Only the last MAX_HISTORY_TURNS exchanges are ever sent to the model
+        self.conversation_history = deque(maxlen=MAX_HISTORY_TURNS)
         self.use_rag = use_rag
         self.doc_store = None
         self.is_cloud = USE_CLOUD_LLM
+        # llama.cpp contexts are not thread-safe; serialize local generation
+        self._model_lock = threading.Lock()
+        # Last assembled system prompt: ((rag_context, user context key), content)
+        self._system_cache = None
+        # User context key -> rendered user-context prompt (LRU)
+        self._context_prompts = OrderedDict()
+        self._context_prompts_lock = threading.Lock()
+        # Local mode: prompt segment text -> token ids (guarded by _model_lock)
+        self._segment_tokens = OrderedDict()
+        # Answers to byte-identical prompts: prompt digest -> response (LRU)
+        self._exact_cache = OrderedDict()
+        self._exact_cache_lock = threading.Lock()
 
     def load_model(self):
         """Load the model - local file or cloud API client."""
+        if self.model is not None or self.client is not None:
+            # Already loaded: keep the existing llama.cpp context and its KV cache
+            return
+
         if self.is_cloud:
             # Cloud mode: Initialize Together AI client
             from together import Together
@@ -50,13 +165,36 @@ class BlackskyChatbot:
                 n_threads=N_THREADS,
                 n_ctx=N_CTX,
                 n_batch=N_BATCH,
+                n_ubatch=N_UBATCH,
+                use_mmap=True,      # Map weights from disk instead of copying
+                use_mlock=False,    # Let the OS page cold weights out
+                offload_kqv=True,   # Keep the KV cache on the GPU when layers are offloaded
                 verbose=False
             )
             print("✓ Model loaded successfully!")
 
+            # Prefill the static system prompt once. llama.cpp reuses the
+            # longest matching token prefix between calls, so every request
+            # skips re-evaluating these tokens.
+            print("  Warming system prompt cache...")
+            prefix_tokens = self.model.tokenize(LLAMA_SYSTEM_PREFIX, add_bos=True, special=True)
+            self.model.eval(prefix_tokens)
+            print(f"✓ Cached {len(prefix_tokens)} system prompt tokens")
+
+            # The KV cache above only holds the last prompt. Interleaved
+            # conversations (several users on one model) diverge right after
+            # the system block, so optionally keep recent states in RAM and
+            # restore the longest matching one instead of re-prefilling.
+            if LLAMA_STATE_CACHE_MB > 0:
+                from llama_cpp import LlamaRAMCache
+                self.model.set_cache(LlamaRAMCache(capacity_bytes=LLAMA_STATE_CACHE_MB << 20))
+                print(f"✓ State cache enabled ({LLAMA_STATE_CACHE_MB} MB)")
+
         # Initialize RAG if enabled
         if self.use_rag:
-            self.doc_store = DocumentStore()
+            # Share the Together client so embeddings and completions reuse
+            # the same connection pool instead of opening a second one
+            self.doc_store = DocumentStore(together_client=self.client)
             self.doc_store.initialize()
         print()
 
@@ -78,205 +216,367 @@ class BlackskyChatbot:
                 parts.append(f"Previous interests: {', '.join(user_context['last_interests'])}")
 
         # Add potential matches for verification
-        if potential_matches and len(potential_matches) > 0:
+        if potential_matches:
             parts.append("\nPOTENTIAL MATCHES (user just provided their name - verify their identity):")
-            for match in potential_matches[:3]:
-                topic = match.get('last_topic', 'general questions')
-                parts.append(f"  - {match.get('name')} who previously asked about: {topic}")
+            parts.append("\n".join(
+                f"  - {match.get('name')} who previously asked about: {match.get('last_topic', 'general questions')}"
+                for match in potential_matches[:3]
+            ))
 
         # Add semantic facts about the user
         if user_context and user_context.get("facts"):
             parts.append("\nKNOWN FACTS ABOUT THIS USER:")
-            for fact_type, value in user_context["facts"].items():
-                # Format fact type nicely (e.g., "pain_point" -> "Pain Point")
-                label = fact_type.replace("_", " ").title()
-                parts.append(f"  {label}: {value}")
+            parts.append("\n".join(
+                f"  {_fact_label(fact_type)}: {value}"
+                for fact_type, value in _prompt_facts(user_context["facts"])
+            ))
 
         if not parts:
             return ""
 
         return "\n\nUSER CONTEXT:\n" + "\n".join(parts)
 
-    def _get_system_content(self, user_message: str, user_context: dict = None, potential_matches: list = None) -> str:
-        """Build the system prompt with RAG and user context."""
-        # Get RAG context if enabled and documents exist
-        rag_context = ""
-        if self.use_rag and self.doc_store and self.doc_store.get_stats()["total_vectors"] > 0:
-            rag_context = self.doc_store.get_context(user_message)
+    def _get_user_context_prompt(self, user_context: dict, potential_matches: list = None,
+                                 context_key: tuple = None) -> str:
+        """Return _build_user_context_prompt output, reusing it while the user's context is unchanged."""
+        # Anonymous first-turn users have nothing to render
+        if not user_context and not potential_matches:
+            return ""
+        if context_key is None:
+            context_key = _user_context_key(user_context, potential_matches)
+        with self._context_prompts_lock:
+            context_prompt = self._context_prompts.get(context_key)
+            if context_prompt is not None:
+                self._context_prompts.move_to_end(context_key)
+                return context_prompt
 
-        # Build system prompt with optional RAG context and user context
-        system_content = SYSTEM_PROMPT
-        if rag_context:
-            system_content = f"{SYSTEM_PROMPT}\n\n{rag_context}"
-        # Add user context and potential matches
         context_prompt = self._build_user_context_prompt(user_context, potential_matches)
+        with self._context_prompts_lock:
+            self._context_prompts[context_key] = context_prompt
+            if len(self._context_prompts) > USER_CONTEXT_CACHE_SIZE:
+                self._context_prompts.popitem(last=False)
+        return context_prompt
+
+    def get_rag_context(self, user_message: str) -> str:
+        """Retrieve document context for a message ("" if RAG is off or not needed).
+
+        Safe to call from a worker thread, so callers can run it alongside
+        other I/O and pass the result to chat()/chat_stream() as rag_context.
+        """
+        if (self.use_rag and self.doc_store and self.doc_store.has_documents
+                and needs_retrieval(user_message)):
+            return self.doc_store.get_context(user_message)
+        return ""
+
+    def _get_system_content(self, user_message: str, user_context: dict = None, potential_matches: list = None,
+                            rag_context: str = None) -> str:
+        """Build the system prompt with RAG and user context."""
+        # Get RAG context unless the caller already fetched it
+        if rag_context is None:
+            rag_context = self.get_rag_context(user_message)
+
+        # Consecutive turns usually share the same RAG/user context; reuse the
+        # assembled string instead of rebuilding it
+        context_key = _user_context_key(user_context, potential_matches)
+        cache_key = (rag_context, context_key)
+        cached = self._system_cache
+        if cached is not None and cached[0] == cache_key:
+            return cached[1]
+
+        # Build system prompt, most stable content first: user context is fixed
+        # for a conversation while RAG context changes per turn, so this order
+        # keeps the longest possible prefix identical for prompt/KV caching
+        parts = [SYSTEM_PROMPT]
+        context_prompt = self._get_user_context_prompt(user_context, potential_matches, context_key)
         if context_prompt:
-            system_content += context_prompt
+            parts.append(context_prompt)
+        if rag_context:
+            parts.append("\n\n")
+            parts.append(rag_context)
+        system_content = "".join(parts)
 
+        self._system_cache = (cache_key, system_content)
         return system_content
 
-    def _build_messages(self, user_message: str, user_context: dict = None, potential_matches: list = None) -> list:
+    def _build_messages(self, user_message: str, user_context: dict = None, potential_matches: list = None,
+                        rag_context: str = None) -> list:
         """Build messages array for Together AI API (OpenAI-compatible format)."""
-        system_content = self._get_system_content(user_message, user_context, potential_matches)
+        system_content = self._get_system_content(user_message, user_context, potential_matches, rag_context)
 
         messages = [{"role": "system", "content": system_content}]
 
-        # Add conversation history
-        for turn in self.conversation_history[-MAX_HISTORY_TURNS:]:
-            messages.append({"role": "user", "content": turn['user']})
-            messages.append({"role": "assistant", "content": turn['assistant']})
+        # Add conversation history. The deque is already bounded to
+        # MAX_HISTORY_TURNS; tuple() snapshots it atomically in case another
+        # request appends a turn while we iterate.
+        # Each turn carries its prebuilt message dicts, so history adds no new
+        # allocations per request
+        for turn in tuple(self.conversation_history):
+            messages.extend(turn.messages)
 
         # Add current user message
         messages.append({"role": "user", "content": user_message})
 
         return messages
 
-    def _build_prompt(self, user_message: str, user_context: dict = None, potential_matches: list = None) -> str:
+    def _build_prompt_segments(self, user_message: str, user_context: dict = None, potential_matches: list = None,
+                               rag_context: str = None) -> list:
         """
         Build the full prompt with system message and conversation history.
         Uses Llama 3.1 instruct format with special tokens (for local mode).
+
+        Returns the prompt as a list of UTF-8 segments, each starting at a header
+        special token, so unchanged segments can be tokenized once and reused.
         """
-        system_content = self._get_system_content(user_message, user_context, potential_matches)
+        system_content = self._get_system_content(user_message, user_context, potential_matches, rag_context)
+
+        # Llama 3.1 format (no begin_of_text - llama.cpp adds it automatically).
+        # system_content starts with SYSTEM_PROMPT, so the prompt always opens
+        # with LLAMA_SYSTEM_PREFIX and hits the KV cache warmed in load_model().
+        parts = [b"".join((SYSTEM_HEADER, system_content.encode("utf-8"), EOT))]
+
+        # Add conversation history. The deque is already bounded to
+        # MAX_HISTORY_TURNS; tuple() snapshots it atomically in case another
+        # request appends a turn while we iterate.
+        append = parts.append
+        join = b"".join
+        for turn in tuple(self.conversation_history):
+            append(join((USER_HEADER, turn.user.encode("utf-8"), EOT)))
+            append(join((ASSISTANT_HEADER, turn.assistant.encode("utf-8"), EOT)))
 
-        # Llama 3.1 format (no begin_of_text - llama.cpp adds it automatically)
-        prompt = f"<|start_header_id|>system<|end_header_id|>\n\n{system_content}<|eot_id|>"
+        # Add current user message
+        append(join((USER_HEADER, user_message.encode("utf-8"), EOT)))
+        append(ASSISTANT_HEADER)
 
-        # Add conversation history
-        for turn in self.conversation_history[-MAX_HISTORY_TURNS:]:
-            prompt += f"<|start_header_id|>user<|end_header_id|>\n\n{turn['user']}<|eot_id|>"
-            prompt += f"<|start_header_id|>assistant<|end_header_id|>\n\n{turn['assistant']}<|eot_id|>"
+        return parts
 
-        # Add current user message
-        prompt += f"<|start_header_id|>user<|end_header_id|>\n\n{user_message}<|eot_id|>"
-        prompt += f"<|start_header_id|>assistant<|end_header_id|>\n\n"
+    def _tokenize_prompt(self, segments: list) -> list:
+        """Tokenize prompt segments, reusing token ids for segments seen before.
+
+        Segments split on special tokens, which the tokenizer never merges
+        across, so concatenating per-segment tokens matches tokenizing the
+        joined prompt. Only new text (usually just the latest turn and a
+        changed system block) hits the tokenizer. Call with _model_lock held.
 
-        return prompt
+        If the prompt would leave less than MAX_TOKENS of N_CTX for the reply,
+        the oldest history exchanges are dropped until it fits.
+        """
+        tokenized = []
+        for i, segment in enumerate(segments):
+            key = (segment, i == 0)
+            segment_tokens = self._segment_tokens.get(key)
+            if segment_tokens is None:
+                # BOS only on the first segment (matches llama.cpp's own tokenization)
+                segment_tokens = self.model.tokenize(segment, add_bos=(i == 0), special=True)
+                self._segment_tokens[key] = segment_tokens
+                if len(self._segment_tokens) > PROMPT_SEGMENT_CACHE_SIZE:
+                    self._segment_tokens.popitem(last=False)
+            else:
+                self._segment_tokens.move_to_end(key)
+            tokenized.append(segment_tokens)
+
+        # Segments are [system, (user, assistant) * history, user, assistant header]
+        total = sum(map(len, tokenized))
+        first_kept = 1
+        history_end = len(tokenized) - 2
+        while total > N_CTX - MAX_TOKENS and first_kept < history_end:
+            total -= len(tokenized[first_kept]) + len(tokenized[first_kept + 1])
+            first_kept += 2
+        if first_kept > 1:
+            logger.debug("Dropped %d history turns to fit the context window", (first_kept - 1) // 2)
+
+        tokens = list(tokenized[0])
+        for segment_tokens in tokenized[first_kept:]:
+            tokens.extend(segment_tokens)
+        return tokens
     
-    def chat(self, user_message: str, user_context: dict = None, potential_matches: list = None) -> str:
+    def _build_prompt(self, user_message: str, user_context: dict = None, potential_matches: list = None,
+                      rag_context: str = None) -> list:
+        """Build the model input: chat messages (cloud) or prompt segments (local)."""
+        if self.is_cloud:
+            return self._build_messages(user_message, user_context, potential_matches, rag_context)
+        return self._build_prompt_segments(user_message, user_context, potential_matches, rag_context)
+
+    def _lookup_response(self, prompt_key) -> str:
+        """Return the cached response to a byte-identical prompt, or None."""
+        if prompt_key is None:
+            return None
+        with self._exact_cache_lock:
+            response = self._exact_cache.get(prompt_key)
+            if response is not None:
+                self._exact_cache.move_to_end(prompt_key)
+                logger.debug("Exact response cache hit")
+        return response
+
+    def _store_response(self, request: PreparedRequest, response: str):
+        """Record a generated response in the exact response cache.
+
+        Empty replies (a blank completion, or a stream cut off before any
+        text) are not stored, so the next identical prompt generates again.
+        """
+        if request.prompt_key is not None and response:
+            with self._exact_cache_lock:
+                self._exact_cache[request.prompt_key] = response
+                if len(self._exact_cache) > EXACT_CACHE_SIZE:
+                    self._exact_cache.popitem(last=False)
+
+    def _prepare_request(self, user_message: str, user_context: dict = None, potential_matches: list = None,
+                         rag_context: str = None) -> PreparedRequest:
+        """Shared front half of chat() and chat_stream(): context, prompt and cache lookup."""
+        if rag_context is None:
+            rag_context = self.get_rag_context(user_message)
+
+        prompt = self._build_prompt(user_message, user_context, potential_matches, rag_context)
+        prompt_key = _prompt_key(prompt) if EXACT_CACHE_ENABLED else None
+
+        return PreparedRequest(prompt, prompt_key, rag_context, self._lookup_response(prompt_key))
+
+    def chat(self, user_message: str, user_context: dict = None, potential_matches: list = None,
+             rag_context: str = None) -> str:
         """
         Generate a response to the user's message.
+        Pass rag_context if it was already retrieved (see get_rag_context).
         """
+        request = self._prepare_request(user_message, user_context, potential_matches, rag_context)
+
+        response = request.cached
+        if response is None:
+            response = self._complete(request.prompt)
+            self._store_response(request, response)
+
+        # Debug: log response
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Response length: %d chars", len(response))
+            logger.debug("Response: %r", response[:200])
+
+        # Store in history
+        self.conversation_history.append(_make_turn(user_message, response))
+
+        return response
+
+    def _complete(self, prompt: list) -> str:
+        """Generate a full (non-streaming) response from the cloud API or local model."""
         if self.is_cloud:
             # Cloud mode: Use Together AI API
             if self.client is None:
                 raise RuntimeError("Together AI client not initialized. Call load_model() first.")
 
-            messages = self._build_messages(user_message, user_context, potential_matches)
-            print(f"[DEBUG] Messages count: {len(messages)}")
+            logger.debug("Messages count: %d", len(prompt))
 
             response_obj = self.client.chat.completions.create(
                 model=TOGETHER_MODEL,
-                messages=messages,
+                messages=prompt,
                 max_tokens=MAX_TOKENS,
                 temperature=TEMPERATURE,
                 top_p=TOP_P,
                 repetition_penalty=REPEAT_PENALTY,
-                stop=["<|eot_id|>"]
+                stop=TOGETHER_STOP
             )
 
-            response = response_obj.choices[0].message.content.strip()
-        else:
-            # Local mode: Use llama-cpp-python
-            if self.model is None:
-                raise RuntimeError("Model not loaded. Call load_model() first.")
+            return response_obj.choices[0].message.content.strip()
 
-            prompt = self._build_prompt(user_message, user_context, potential_matches)
+        # Local mode: Use llama-cpp-python
+        if self.model is None:
+            raise RuntimeError("Model not loaded. Call load_model() first.")
 
-            # Debug: log prompt size
-            print(f"[DEBUG] Prompt length: {len(prompt)} chars, ~{len(prompt) // 4} tokens")
+        # Generate response
+        with self._model_lock:
+            prompt_tokens = self._tokenize_prompt(prompt)
+            logger.debug("Prompt length: %d tokens", len(prompt_tokens))
 
-            # Generate response
             output = self.model(
-                prompt,
+                prompt_tokens,
                 max_tokens=MAX_TOKENS,
                 temperature=TEMPERATURE,
                 top_p=TOP_P,
                 repeat_penalty=REPEAT_PENALTY,
-                stop=["<|eot_id|>", "<|start_header_id|>"],
+                stop=LLAMA_STOP,
                 echo=False
             )
 
-            response = output["choices"][0]["text"].strip()
+        return output["choices"][0]["text"].strip()
 
-        # Debug: log response
-        print(f"[DEBUG] Response length: {len(response)} chars")
-        print(f"[DEBUG] Response: {repr(response[:200])}")
-        
-        # Store in history
-        self.conversation_history.append({
-            "user": user_message,
-            "assistant": response
-        })
-        
-        return response
-    
-    def chat_stream(self, user_message: str, user_context: dict = None, potential_matches: list = None):
+    def chat_stream(self, user_message: str, user_context: dict = None, potential_matches: list = None,
+                    rag_context: str = None):
         """
         Generate a streaming response to the user's message.
-        Yields tokens as they are generated.
+        Yields text as it is generated, coalesced into small chunks
+        (STREAM_FLUSH_CHARS / STREAM_FLUSH_INTERVAL) to cut per-token overhead.
+        Pass rag_context if it was already retrieved (see get_rag_context).
         """
-        full_response = ""
+        request = self._prepare_request(user_message, user_context, potential_matches, rag_context)
+
+        cached = request.cached
+        if cached is not None:
+            for i in range(0, len(cached), STREAM_FLUSH_CHARS):
+                yield cached[i:i + STREAM_FLUSH_CHARS]
+            full_response = cached
+        else:
+            # Collect chunks and join once at the end (no quadratic string +=)
+            chunks = []
+            append = chunks.append
+
+            tokens = self._stream_tokens(request.prompt)
+            for chunk in coalesce_tokens(tokens, STREAM_FLUSH_CHARS, STREAM_FLUSH_INTERVAL):
+                append(chunk)
+                yield chunk
 
+            full_response = "".join(chunks).strip()
+            self._store_response(request, full_response)
+
+        # Store in history after streaming completes
+        self.conversation_history.append(_make_turn(user_message, full_response))
+
+        logger.debug("Response length: %d chars", len(full_response))
+
+    def _stream_tokens(self, prompt: list):
+        """Yield raw tokens from the cloud API or local model."""
         if self.is_cloud:
             # Cloud mode: Use Together AI API with streaming
             if self.client is None:
                 raise RuntimeError("Together AI client not initialized. Call load_model() first.")
 
-            messages = self._build_messages(user_message, user_context, potential_matches)
-            print(f"[DEBUG] Messages count: {len(messages)}")
+            logger.debug("Messages count: %d", len(prompt))
 
             stream = self.client.chat.completions.create(
                 model=TOGETHER_MODEL,
-                messages=messages,
+                messages=prompt,
                 max_tokens=MAX_TOKENS,
                 temperature=TEMPERATURE,
                 top_p=TOP_P,
                 repetition_penalty=REPEAT_PENALTY,
-                stop=["<|eot_id|>"],
+                stop=TOGETHER_STOP,
                 stream=True
             )
 
             for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    token = chunk.choices[0].delta.content
-                    full_response += token
-                    yield token
+                text = chunk.choices[0].delta.content
+                if text:
+                    yield text
         else:
             # Local mode: Use llama-cpp-python
             if self.model is None:
                 raise RuntimeError("Model not loaded. Call load_model() first.")
 
-            prompt = self._build_prompt(user_message, user_context, potential_matches)
-
-            # Debug: log prompt size
-            print(f"[DEBUG] Prompt length: {len(prompt)} chars, ~{len(prompt) // 4} tokens")
-
             # Generate response with streaming
-            for output in self.model(
-                prompt,
-                max_tokens=MAX_TOKENS,
-                temperature=TEMPERATURE,
-                top_p=TOP_P,
-                repeat_penalty=REPEAT_PENALTY,
-                stop=["<|eot_id|>", "<|start_header_id|>"],
-                echo=False,
-                stream=True
-            ):
-                token = output["choices"][0]["text"]
-                full_response += token
-                yield token
-        
-        # Store in history after streaming completes
-        self.conversation_history.append({
-            "user": user_message,
-            "assistant": full_response.strip()
-        })
-        
-        print(f"[DEBUG] Response length: {len(full_response)} chars")
-    
+            with self._model_lock:
+                prompt_tokens = self._tokenize_prompt(prompt)
+                logger.debug("Prompt length: %d tokens", len(prompt_tokens))
+
+                for output in self.model(
+                    prompt_tokens,
+                    max_tokens=MAX_TOKENS,
+                    temperature=TEMPERATURE,
+                    top_p=TOP_P,
+                    repeat_penalty=REPEAT_PENALTY,
+                    stop=LLAMA_STOP,
+                    echo=False,
+                    stream=True
+                ):
+                    yield output["choices"][0]["text"]
+
     def clear_history(self):
         """Clear conversation history."""
-        self.conversation_history = []
+        self.conversation_history.clear()
         return "Conversation cleared. Fresh start!"
     
     def get_stats(self) -> dict:
@@ -300,6 +600,8 @@ class BlackskyChatbot:
 
 # CLI interface for testing
 if __name__ == "__main__":
+    logging.basicConfig(level=LOG_LEVEL, format="[%(levelname)s] %(name)s: %(message)s")
+
     print("=" * 50)
     print("Blacksky Chatbot - CLI Mode")
     print("=" * 50)
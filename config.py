@@ -30,19 +30,34 @@ if IS_MAC:
     N_GPU_LAYERS = -1  # Offload all layers to GPU
     N_THREADS = 8
     N_CTX = 4096  # Mistral supports larger context
-    N_BATCH = 512
+    N_BATCH = 2048  # Logical prefill batch: long RAG prompts in few decode calls
+    N_UBATCH = 512  # Physical batch per Metal graph
 elif IS_ARM_LINUX:
     # Raspberry Pi 500 - CPU only, will be slow with 7B model
     N_GPU_LAYERS = 0
     N_THREADS = 4
     N_CTX = 2048
     N_BATCH = 256
+    N_UBATCH = 256
 else:
-    # Generic fallback
+    # Generic fallback - use the cores this process may run on (capped; more
+    # threads stop helping). os.cpu_count() counts every host CPU, which
+    # oversubscribes llama.cpp inside a container or cpuset.
     N_GPU_LAYERS = 0
-    N_THREADS = 4
+    _usable_cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    N_THREADS = min(16, _usable_cpus or 4)
     N_CTX = 4096
     N_BATCH = 512
+    N_UBATCH = 512
+
+# Explicit thread count override for the host (e.g. a container with a CPU quota)
+N_THREADS = int(os.getenv("LLAMA_THREADS", "0")) or N_THREADS
+
+# llama.cpp state cache (local mode). When > 0, KV states for recent prompts
+# are kept in RAM so conversations that interleave on one model can resume
+# from their own prefix instead of re-prefilling it. Each state can take
+# hundreds of MB, so this is opt-in.
+LLAMA_STATE_CACHE_MB = int(os.getenv("LLAMA_STATE_CACHE_MB", "0"))
 
 # Generation settings (same across platforms)
 MAX_TOKENS = 400
@@ -54,9 +69,16 @@ REPEAT_PENALTY = 1.1
 HOST = "0.0.0.0"
 PORT = 8000
 
+# Logging level for chatbot diagnostics (set LOG_LEVEL=DEBUG for prompt/response sizes)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
 # Conversation settings
 MAX_HISTORY_TURNS = 4  # Keep last N exchanges to manage context size
 
+# Streaming settings - tokens are grouped before being sent to the client
+STREAM_FLUSH_CHARS = 32  # Flush once this many characters are buffered
+STREAM_FLUSH_INTERVAL = 0.025  # ...or this many seconds since the last flush
+
 # Admin dashboard password (local dev only)
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "localdev")
 
@@ -84,3 +106,11 @@ DOCS_DIR = Path(__file__).parent / "documents"
 CHUNK_SIZE = 500
 CHUNK_OVERLAP = 50
 TOP_K = 3
+RAG_CACHE_SIZE = 256  # Max cached query -> context lookups (cleared on reindex)
+RAG_CACHE_SIMILARITY = 0.95  # Min cosine similarity to reuse another query's context
+RAG_TIMEOUT = 2.0  # Seconds to wait for retrieval before answering without it
+
+# Exact response cache - replay the answer to a byte-identical prompt.
+# Opt-in: with TEMPERATURE > 0 a replay freezes one sampled reply.
+EXACT_CACHE_ENABLED = os.getenv("EXACT_CACHE_ENABLED", "false").lower() == "true"
+EXACT_CACHE_SIZE = 512  # Max cached responses to byte-identical prompts
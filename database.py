@@ -294,9 +294,11 @@ def get_user_context(user_id: str) -> Optional[dict]:
         user_facts = session.query(UserFact).filter(
             UserFact.user_id == user_id,
             UserFact.confidence >= 0.6
-        ).order_by(UserFact.confidence.desc()).all()
+        ).order_by(UserFact.confidence.desc(), UserFact.id.desc()).all()
 
-        # Build facts dict (highest confidence for each type)
+        # Build facts dict (highest confidence for each type, newest on ties).
+        # The full ordering keeps the dict - and the prompt built from it -
+        # identical between requests.
         facts_dict = {}
         for f in user_facts:
             if f.fact_type not in facts_dict:
@@ -1044,9 +1046,9 @@ def get_user_facts_dict(user_id: str, min_confidence: float = 0.6) -> dict:
         facts = session.query(UserFact).filter(
             UserFact.user_id == user_id,
             UserFact.confidence >= min_confidence
-        ).order_by(UserFact.confidence.desc()).all()
+        ).order_by(UserFact.confidence.desc(), UserFact.id.desc()).all()
 
-        # Return dict with highest confidence fact for each type
+        # Return dict with highest confidence fact for each type (newest on ties)
         facts_dict = {}
         for f in facts:
             if f.fact_type not in facts_dict:
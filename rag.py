@@ -5,6 +5,10 @@ Uses Pinecone for vector storage
 - Cloud: Together AI embeddings API
 """
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from operator import itemgetter
 from pathlib import Path
 from typing import List
 
@@ -16,10 +20,14 @@ from config import (
     CHUNK_SIZE,
     CHUNK_OVERLAP,
     TOP_K,
+    RAG_CACHE_SIZE,
+    RAG_CACHE_SIMILARITY,
+    RAG_TIMEOUT,
     USE_CLOUD_LLM,
     TOGETHER_API_KEY,
     TOGETHER_EMBEDDING_MODEL
 )
+from utils.semantic_cache import SemanticCache
 
 # Lazy imports - only load when needed
 Pinecone = None
@@ -38,12 +46,18 @@ def _load_pinecone():
 class DocumentStore:
     """Manages document storage and retrieval using Pinecone."""
 
-    def __init__(self):
+    def __init__(self, together_client=None):
         self.pc = None
         self.index = None
         self.encoder = None  # SentenceTransformer for local
-        self.together_client = None  # Together client for cloud
+        self.together_client = together_client  # Together client for cloud (may be shared)
         self.is_cloud = USE_CLOUD_LLM
+        self.has_documents = False  # Cached "index is non-empty" flag for the chat path
+        self._context_cache = OrderedDict()  # (normalized query, top_k) -> context
+        self._similar_contexts = SemanticCache(RAG_CACHE_SIZE, RAG_CACHE_SIMILARITY)  # query embedding -> context
+        self._query_embeddings = OrderedDict()  # query text -> embedding
+        self._pending_embeddings = {}  # query text -> Future for an embedding in flight
+        self._cache_lock = threading.Lock()  # get_context runs in worker threads
 
     def initialize(self):
         """Initialize Pinecone and embedding model."""
@@ -58,8 +72,9 @@ class DocumentStore:
         # Initialize embedding model based on mode
         if self.is_cloud:
             print(f"  Using Together AI embeddings ({TOGETHER_EMBEDDING_MODEL})...")
-            from together import Together
-            self.together_client = Together(api_key=TOGETHER_API_KEY)
+            if self.together_client is None:
+                from together import Together
+                self.together_client = Together(api_key=TOGETHER_API_KEY)
         else:
             print("  Loading local embedding model (all-MiniLM-L6-v2)...")
             from sentence_transformers import SentenceTransformer
@@ -88,6 +103,7 @@ class DocumentStore:
 
         # Get stats
         stats = self.index.describe_index_stats()
+        self.has_documents = stats.total_vector_count > 0
         print(f"✓ Document store ready. {stats.total_vector_count} vectors indexed.")
 
     def _encode(self, texts: List[str]) -> List[List[float]]:
@@ -107,6 +123,45 @@ class DocumentStore:
         """Generate embedding for a single text."""
         return self._encode([text])[0]
 
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a search query, reusing recent embeddings of the same text.
+
+        Shared by get_context() and search() so one turn never embeds the
+        same message twice, and concurrent identical queries share a single
+        embedding call. Waiters give up after RAG_TIMEOUT seconds with
+        concurrent.futures.TimeoutError, like the server does.
+        """
+        with self._cache_lock:
+            embedding = self._query_embeddings.get(query)
+            if embedding is not None:
+                self._query_embeddings.move_to_end(query)
+                return embedding
+
+            # Concurrent requests for the same text wait on the first one's
+            # embedding call instead of issuing their own
+            pending = self._pending_embeddings.get(query)
+            if pending is None:
+                self._pending_embeddings[query] = future = Future()
+        if pending is not None:
+            return pending.result(timeout=RAG_TIMEOUT)
+
+        try:
+            embedding = self._encode_single(query)
+        except Exception as e:
+            with self._cache_lock:
+                del self._pending_embeddings[query]
+            future.set_exception(e)
+            raise
+
+        with self._cache_lock:
+            self._query_embeddings[query] = embedding
+            if len(self._query_embeddings) > RAG_CACHE_SIZE:
+                self._query_embeddings.popitem(last=False)
+            del self._pending_embeddings[query]
+        future.set_result(embedding)
+
+        return embedding
+
     def _chunk_text(self, text: str, source: str) -> List[dict]:
         """Split text into overlapping chunks."""
         chunks = []
@@ -161,6 +216,8 @@ class DocumentStore:
         chunks = self._chunk_text(text, source)
 
         if not chunks:
+            # The old vectors are gone; drop contexts built from them
+            self._clear_context_caches()
             return 0
 
         # Generate embeddings
@@ -178,6 +235,9 @@ class DocumentStore:
         ]
 
         self.index.upsert(vectors=vectors)
+        self.has_documents = True
+        # Only now: contexts cached while the upsert ran still hold the old text
+        self._clear_context_caches()
 
         print(f"  Added {len(chunks)} chunks from {source}")
         return len(chunks)
@@ -195,7 +255,7 @@ class DocumentStore:
     def search(self, query: str, top_k: int = TOP_K) -> List[dict]:
         """Search for relevant document chunks."""
         # Generate query embedding
-        query_embedding = self._encode_single(query)
+        query_embedding = self.embed_query(query)
 
         # Query Pinecone
         results = self.index.query(
@@ -208,6 +268,7 @@ class DocumentStore:
         chunks = []
         for match in results.matches:
             chunks.append({
+                "id": match.id,
                 "text": match.metadata.get("text", ""),
                 "source": match.metadata.get("source", ""),
                 "score": match.score
@@ -216,21 +277,61 @@ class DocumentStore:
         return chunks
 
     def get_context(self, query: str, top_k: int = TOP_K) -> str:
-        """Get formatted context string for injection into prompt."""
+        """Get formatted context string for injection into prompt.
+
+        Results are cached per normalized query so repeated questions skip
+        the embedding call and the Pinecone query. Queries whose embedding is
+        close to an earlier one reuse its context and skip the Pinecone query.
+        """
+        cache_key = (" ".join(query.lower().split()), top_k)
+        with self._cache_lock:
+            cached = self._context_cache.get(cache_key)
+            if cached is not None:
+                self._context_cache.move_to_end(cache_key)
+                return cached
+
+        # Near-identical phrasings ("what do you charge" / "what do you charge?")
+        # retrieve the same chunks; reuse them and skip the Pinecone query
+        query_embedding = self.embed_query(query)
+        context = self._similar_contexts.lookup(query_embedding, scope=top_k)
+        if context is not None:
+            self._cache_context(cache_key, context)
+            return context
+
         chunks = self.search(query, top_k)
 
-        if not chunks:
-            return ""
+        if chunks:
+            context_parts = ["Reference information (use naturally, do not copy formatting):"]
+            # Stable chunk order: the same top-k renders to the same bytes
+            # regardless of score order, so cached prompt prefixes still match
+            for chunk in sorted(chunks, key=itemgetter("id")):
+                context_parts.append(chunk['text'])
+            context = "\n\n".join(context_parts)
+        else:
+            context = ""
+
+        self._cache_context(cache_key, context)
+        self._similar_contexts.add(query_embedding, context, scope=top_k)
+
+        return context
 
-        context_parts = ["Reference information (use naturally, do not copy formatting):"]
-        for chunk in chunks:
-            context_parts.append(chunk['text'])
+    def _cache_context(self, cache_key: tuple, context: str):
+        """Store a context string in the exact-query LRU cache."""
+        with self._cache_lock:
+            self._context_cache[cache_key] = context
+            if len(self._context_cache) > RAG_CACHE_SIZE:
+                self._context_cache.popitem(last=False)
 
-        return "\n\n".join(context_parts)
+    def _clear_context_caches(self):
+        """Drop cached contexts after the indexed documents change."""
+        with self._cache_lock:
+            self._context_cache.clear()
+            self._similar_contexts.clear()
 
     def get_stats(self) -> dict:
         """Get index statistics."""
         stats = self.index.describe_index_stats()
+        self.has_documents = stats.total_vector_count > 0
         return {
             "total_vectors": stats.total_vector_count,
             "dimension": stats.dimension
@@ -247,6 +348,8 @@ class DocumentStore:
     def clear(self):
         """Clear all documents from the store."""
         self.index.delete(delete_all=True)
+        self.has_documents = False
+        self._clear_context_caches()
         print("Document store cleared.")
 
 
@@ -2,17 +2,19 @@
 FastAPI server for Blacksky Chatbot
 Provides REST API for chat interactions with user tracking and admin dashboard
 """
-from fastapi import FastAPI, HTTPException, UploadFile, File, Query, Request
+from fastapi import FastAPI, HTTPException, UploadFile, File, Query, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, StreamingResponse, HTMLResponse, RedirectResponse
 from pydantic import BaseModel
+from starlette.concurrency import iterate_in_threadpool
 from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Optional, List
 import time
 import json
 import asyncio
+import logging
 import re
 import uuid
 from datetime import datetime, timedelta
@@ -20,8 +22,9 @@ from datetime import datetime, timedelta
 import jwt
 
 from chatbot import BlackskyChatbot
-from config import HOST, PORT, ADMIN_PASSWORD, JWT_SECRET_KEY, USE_CLOUD_LLM
+from config import HOST, PORT, ADMIN_PASSWORD, JWT_SECRET_KEY, USE_CLOUD_LLM, LOG_LEVEL, RAG_TIMEOUT
 from rag import DocumentStore, DOCS_DIR
+from utils.retrieval import SMALL_TALK_PATTERN
 from database import (
     init_db, get_or_create_user, update_user, save_conversation, update_conversation,
     get_user_context, get_leads, lookup_users_by_name, link_users,
@@ -30,6 +33,9 @@ from database import (
     verify_hard_login, get_all_exchanges, save_user_facts, get_user_facts
 )
 
+logging.basicConfig(level=LOG_LEVEL, format="[%(levelname)s] %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
 # Paths
 STATIC_DIR = Path(__file__).parent / "static"
 STATIC_DIR.mkdir(exist_ok=True)
@@ -159,21 +165,53 @@ async def db_health():
         session.close()
 
 
+def load_user_context(user_id: Optional[str]) -> Optional[dict]:
+    """Ensure the user exists and return their context (None if no user_id)."""
+    if not user_id:
+        return None
+    get_or_create_user(user_id)
+    return get_user_context(user_id)
+
+
+async def fetch_rag_context(message: str) -> str:
+    """Retrieve RAG context, giving up after RAG_TIMEOUT seconds.
+
+    A slow embedding or Pinecone call then costs at most RAG_TIMEOUT of
+    time-to-first-token; the turn is answered without document context.
+    """
+    try:
+        return await asyncio.wait_for(asyncio.to_thread(bot.get_rag_context, message), RAG_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("RAG retrieval exceeded %.1fs, answering without context", RAG_TIMEOUT)
+        return ""
+
+
+async def gather_chat_context(message: str, user_id: Optional[str]) -> tuple:
+    """Fetch user context (DB) and RAG context (embeddings + Pinecone) concurrently.
+
+    Both are blocking calls, so they run in worker threads; the turn waits for
+    the slower of the two instead of their sum.
+    """
+    return await asyncio.gather(
+        asyncio.to_thread(load_user_context, user_id),
+        fetch_rag_context(message)
+    )
+
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """Send a message and get a response."""
     if not request.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty")
 
-    # Get user context if user_id provided
-    user_context = None
-    if request.user_id:
-        get_or_create_user(request.user_id)
-        user_context = get_user_context(request.user_id)
-
     start = time.time()
-    response = bot.chat(request.message, user_context=user_context,
-                       potential_matches=request.potential_matches)
+    user_context, rag_context = await gather_chat_context(request.message, request.user_id)
+
+    # Generation blocks, so keep it off the event loop
+    response = await asyncio.to_thread(
+        bot.chat, request.message, user_context=user_context,
+        potential_matches=request.potential_matches, rag_context=rag_context
+    )
     elapsed = (time.time() - start) * 1000
 
     return ChatResponse(
@@ -193,18 +231,16 @@ async def chat_stream(request: ChatRequest):
     else:
         message = request.message
 
-    # Get user context if user_id provided
-    user_context = None
-    if request.user_id:
-        get_or_create_user(request.user_id)
-        user_context = get_user_context(request.user_id)
+    user_context, rag_context = await gather_chat_context(message, request.user_id)
 
     async def generate():
         try:
-            for token in bot.chat_stream(message, user_context=user_context,
-                                        potential_matches=request.potential_matches):
+            # Pull tokens in a worker thread so generation never blocks the event loop
+            tokens = bot.chat_stream(message, user_context=user_context,
+                                     potential_matches=request.potential_matches,
+                                     rag_context=rag_context)
+            async for token in iterate_in_threadpool(tokens):
                 yield f"data: {json.dumps({'token': token})}\n\n"
-                await asyncio.sleep(0)  # Yield to event loop for streaming
             yield "data: [DONE]\n\n"
         except Exception as e:
             yield f"data: {json.dumps({'error': str(e)})}\n\n"
@@ -221,7 +257,7 @@ async def chat_stream(request: ChatRequest):
 
 
 @app.post("/conversation/end")
-async def end_conversation(request: ConversationEndRequest):
+async def end_conversation(request: ConversationEndRequest, background_tasks: BackgroundTasks):
     """Save conversation when user leaves or goes idle."""
     if not request.messages:
         return {"status": "skipped", "reason": "No messages to save"}
@@ -291,16 +327,11 @@ async def end_conversation(request: ConversationEndRequest):
         )
         status = "saved" if conv_id else "save_failed"
 
-    # Extract and save semantic facts
+    # Extract semantic facts; saving them is only needed by the user's next
+    # conversation, so it runs after the response is sent
     semantic_facts = extract_semantic_facts(request.messages)
-    facts_saved = 0
     if semantic_facts:
-        facts_saved = save_user_facts(
-            user_id=request.user_id,
-            facts=semantic_facts,
-            conversation_id=conv_id
-        )
-        print(f"Extracted {len(semantic_facts)} facts, saved {facts_saved} for user {request.user_id}")
+        background_tasks.add_task(save_semantic_facts, request.user_id, semantic_facts, conv_id)
 
     return {
         "status": status,
@@ -310,11 +341,20 @@ async def end_conversation(request: ConversationEndRequest):
         "email_extracted": email,
         "phone_extracted": phone,
         "company_extracted": company,
-        "facts_extracted": len(semantic_facts),
-        "facts_saved": facts_saved
+        "facts_extracted": len(semantic_facts)
     }
 
 
+def save_semantic_facts(user_id: str, facts: list, conversation_id: Optional[int]):
+    """Persist extracted facts (run as a background task after /conversation/end responds)."""
+    facts_saved = save_user_facts(
+        user_id=user_id,
+        facts=facts,
+        conversation_id=conversation_id
+    )
+    print(f"Extracted {len(facts)} facts, saved {facts_saved} for user {user_id}")
+
+
 def extract_user_name(messages: list) -> Optional[str]:
     """Extract user's name from conversation messages.
 
@@ -472,6 +512,10 @@ def extract_semantic_facts(messages: list) -> list:
 
         text = msg.get("content", "")
 
+        # "thanks", "ok", greetings... can't state a fact; skip the pattern scan
+        if SMALL_TALK_PATTERN.match(text.strip()):
+            continue
+
         for fact_type, patterns in SEMANTIC_FACT_PATTERNS.items():
             # Skip if we already found this fact type with high confidence
             if fact_type in seen_types:
@@ -0,0 +1,194 @@
+"""
+Tests for BlackskyChatbot request handling, using a fake local model and document store.
+Run with: pytest tests/test_chatbot.py -v
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path so we can import from project modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+import chatbot
+from chatbot import BlackskyChatbot, _make_turn
+
+
+class FakeModel:
+    """Stands in for llama_cpp.Llama: one token per 4 bytes, numbered replies.
+
+    Each "token" is the segment it came from, so tests can see which
+    segments made it into a prompt.
+    """
+
+    def __init__(self, reply: str = None):
+        self.calls = []
+        self.reply = reply
+
+    def tokenize(self, text: bytes, add_bos: bool = False, special: bool = False) -> list:
+        return [text] * (len(text) // 4 + 1)
+
+    def __call__(self, prompt_tokens, stream=False, **kwargs):
+        self.calls.append(prompt_tokens)
+        text = self.reply if self.reply is not None else f"answer {len(self.calls)}"
+        if stream:
+            return iter([{"choices": [{"text": text}]}])
+        return {"choices": [{"text": text}]}
+
+
+class FakeDocStore:
+    """Returns the same context for every question."""
+
+    has_documents = True
+
+    def get_context(self, query: str) -> str:
+        return "Reference information: Blacksky builds software."
+
+
+def make_bot() -> BlackskyChatbot:
+    bot = BlackskyChatbot(use_rag=True)
+    bot.is_cloud = False
+    bot.model = FakeModel()
+    bot.doc_store = FakeDocStore()
+    return bot
+
+
+# ============================================================
+# Response cache tests
+# ============================================================
+
+class TestResponseCache:
+    """Tests for the exact response cache in chat()."""
+
+    @pytest.fixture(autouse=True)
+    def enable_cache(self, monkeypatch):
+        monkeypatch.setattr(chatbot, "EXACT_CACHE_ENABLED", True)
+
+    def test_repeat_prompt_served_from_cache(self):
+        bot = make_bot()
+        first = bot.chat("What services does Blacksky offer?")
+        bot.clear_history()
+        second = bot.chat("What services does Blacksky offer?")
+        assert second == first
+        assert len(bot.model.calls) == 1
+
+    def test_rephrased_question_is_generated(self):
+        bot = make_bot()
+        bot.chat("What services does Blacksky offer?")
+        bot.clear_history()
+        bot.chat("What services does Blacksky provide?")
+        assert len(bot.model.calls) == 2
+
+    def test_answer_given_with_history_is_not_shared(self):
+        bot = make_bot()
+        bot.chat("My name is Bob and I work at Acme")
+        personalized = bot.chat("What services does Blacksky offer?")
+
+        # A new anonymous visitor asks the same question
+        bot.clear_history()
+        answer = bot.chat("What services does Blacksky offer?")
+        assert answer != personalized
+        assert len(bot.model.calls) == 3
+
+    def test_empty_reply_not_cached(self):
+        bot = make_bot()
+        bot.model.reply = "  \n"
+        assert bot.chat("What services does Blacksky offer?") == ""
+        bot.clear_history()
+
+        bot.model.reply = None
+        assert bot.chat("What services does Blacksky offer?") == "answer 2"
+        assert len(bot.model.calls) == 2
+
+    def test_off_by_default(self, monkeypatch):
+        monkeypatch.setattr(chatbot, "EXACT_CACHE_ENABLED", False)
+        bot = make_bot()
+        bot.chat("What services does Blacksky offer?")
+        bot.clear_history()
+        bot.chat("What services does Blacksky offer?")
+        assert len(bot.model.calls) == 2
+        assert len(bot._exact_cache) == 0
+
+
+# ============================================================
+# User context prompt tests
+# ============================================================
+
+class TestUserContextPrompt:
+    """Tests for the cached user-context prompt."""
+
+    def test_client_supplied_list_values(self):
+        bot = make_bot()
+        matches = [{"name": "Bob", "last_topic": ["cloud", "ai"]}]
+        user_context = {
+            "is_returning": True,
+            "name": "Bob",
+            "last_interests": ["cloud", "ai"],
+            "facts": {"interest": ["cloud", "ai"]},
+        }
+        prompt = bot._get_user_context_prompt(user_context, matches)
+        assert "Bob" in prompt
+        assert "cloud" in prompt
+        assert bot._get_user_context_prompt(user_context, matches) == prompt
+
+    def test_facts_rendered_in_stable_order(self):
+        bot = make_bot()
+        facts = {"role": "CTO", "company": "Acme", "pain_point": "legacy systems"}
+        prompt = bot._get_user_context_prompt({"facts": facts})
+        reordered = bot._build_user_context_prompt({"facts": dict(reversed(list(facts.items())))})
+        assert prompt == reordered
+        assert prompt.index("Company: Acme") < prompt.index("Pain Point: legacy systems") < prompt.index("Role: CTO")
+
+    def test_changed_context_is_rebuilt(self):
+        bot = make_bot()
+        first = bot._get_user_context_prompt({"is_returning": True, "name": "Bob"})
+        second = bot._get_user_context_prompt({"is_returning": True, "name": "Alice"})
+        assert "Bob" in first
+        assert "Alice" in second
+
+
+# ============================================================
+# Prompt tokenization tests
+# ============================================================
+
+class TestTokenizePrompt:
+    """Tests for _tokenize_prompt trimming history to fit the context window."""
+
+    def make_history_bot(self, turns: int) -> BlackskyChatbot:
+        bot = make_bot()
+        for i in range(turns):
+            bot.conversation_history.append(_make_turn(f"question {i} " * 10, f"answer {i} " * 10))
+        return bot
+
+    def kept_segments(self, bot: BlackskyChatbot, segments: list) -> list:
+        tokens = bot._tokenize_prompt(segments)
+        return [segment for segment in segments if segment in tokens]
+
+    def test_prompt_that_fits_is_unchanged(self):
+        bot = self.make_history_bot(3)
+        segments = bot._build_prompt_segments("What is new?", rag_context="")
+        assert self.kept_segments(bot, segments) == segments
+
+    def test_oldest_exchanges_dropped_on_overflow(self, monkeypatch):
+        bot = self.make_history_bot(3)
+        segments = bot._build_prompt_segments("What is new?", rag_context="")
+        sizes = [len(bot.model.tokenize(segment)) for segment in segments]
+
+        # Room for everything except the first history exchange
+        monkeypatch.setattr(chatbot, "MAX_TOKENS", 10)
+        monkeypatch.setattr(chatbot, "N_CTX", sum(sizes) - sizes[1] - sizes[2] + 10)
+
+        kept = self.kept_segments(bot, segments)
+        assert kept == [segments[0]] + segments[3:]
+        assert len(bot._tokenize_prompt(segments)) == sum(sizes) - sizes[1] - sizes[2]
+
+    def test_system_block_and_new_turn_always_kept(self, monkeypatch):
+        bot = self.make_history_bot(3)
+        segments = bot._build_prompt_segments("What is new?", rag_context="")
+
+        # Not even the system block fits; all history goes, nothing else does
+        monkeypatch.setattr(chatbot, "MAX_TOKENS", 10)
+        monkeypatch.setattr(chatbot, "N_CTX", 11)
+
+        kept = self.kept_segments(bot, segments)
+        assert kept == [segments[0]] + segments[-2:]
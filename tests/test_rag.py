@@ -0,0 +1,163 @@
+"""
+Tests for DocumentStore caching (no Pinecone or embedding model needed).
+Run with: pytest tests/test_rag.py -v
+"""
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from pathlib import Path
+
+# Add parent directory to path so we can import from project modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+import rag
+from rag import DocumentStore
+
+
+WAITERS = 4
+
+
+def make_store(encode_single) -> DocumentStore:
+    store = DocumentStore()
+    store._encode_single = encode_single
+    return store
+
+
+def embed_concurrently(store: DocumentStore, release: threading.Event, query: str = "pricing"):
+    """Call embed_query from several threads while the first embedding call is held."""
+    with ThreadPoolExecutor(max_workers=WAITERS) as pool:
+        futures = [pool.submit(store.embed_query, query) for _ in range(WAITERS)]
+        # Let every thread reach embed_query before the embedding finishes
+        deadline = time.monotonic() + 2
+        while time.monotonic() < deadline and not all(f.running() for f in futures):
+            time.sleep(0.01)
+        time.sleep(0.05)
+        release.set()
+        return [f.exception(timeout=5) or f.result() for f in futures]
+
+
+# ============================================================
+# Single-flight embedding tests
+# ============================================================
+
+class TestEmbedQuery:
+    """Tests for concurrent identical queries sharing one embedding call."""
+
+    def test_waiters_share_one_embedding(self):
+        release = threading.Event()
+        calls = []
+
+        def encode_single(query):
+            calls.append(query)
+            release.wait(5)
+            return [0.5, 0.5]
+
+        store = make_store(encode_single)
+        results = embed_concurrently(store, release)
+
+        assert results == [[0.5, 0.5]] * WAITERS
+        assert calls == ["pricing"]
+        assert store._pending_embeddings == {}
+        assert store._query_embeddings["pricing"] == [0.5, 0.5]
+
+    def test_failure_reaches_every_waiter(self):
+        release = threading.Event()
+        calls = []
+
+        def encode_single(query):
+            calls.append(query)
+            release.wait(5)
+            raise RuntimeError("embedding service down")
+
+        store = make_store(encode_single)
+        results = embed_concurrently(store, release)
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert calls == ["pricing"]
+        assert store._pending_embeddings == {}
+        assert "pricing" not in store._query_embeddings
+
+    def test_retry_after_failure(self):
+        attempts = []
+
+        def encode_single(query):
+            attempts.append(query)
+            if len(attempts) == 1:
+                raise RuntimeError("embedding service down")
+            return [1.0, 0.0]
+
+        store = make_store(encode_single)
+        with pytest.raises(RuntimeError):
+            store.embed_query("pricing")
+        assert store.embed_query("pricing") == [1.0, 0.0]
+        assert len(attempts) == 2
+
+    def test_waiter_gives_up_after_timeout(self, monkeypatch):
+        monkeypatch.setattr(rag, "RAG_TIMEOUT", 0.05)
+        started = threading.Event()
+        release = threading.Event()
+
+        def encode_single(query):
+            started.set()
+            release.wait(5)
+            return [0.5, 0.5]
+
+        store = make_store(encode_single)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            owner = pool.submit(store.embed_query, "pricing")
+            started.wait(5)
+            with pytest.raises(TimeoutError):
+                store.embed_query("pricing")
+            release.set()
+            assert owner.result(timeout=5) == [0.5, 0.5]
+
+
+class FakeIndex:
+    """Stands in for a Pinecone index; runs a hook while upserting."""
+
+    def __init__(self, during_upsert=None):
+        self.during_upsert = during_upsert
+
+    def delete(self, **kwargs):
+        pass
+
+    def upsert(self, vectors):
+        if self.during_upsert:
+            self.during_upsert()
+
+
+# ============================================================
+# Context cache invalidation tests
+# ============================================================
+
+class TestAddDocument:
+    """Tests for add_document dropping cached contexts."""
+
+    def make_store(self, during_upsert=None) -> DocumentStore:
+        store = DocumentStore()
+        store.index = FakeIndex(during_upsert)
+        store._encode = lambda texts: [[0.0, 1.0] for _ in texts]
+        store._cache_context(("pricing", 3), "old pricing context")
+        return store
+
+    def test_context_cached_during_upsert_is_dropped(self, tmp_path):
+        doc = tmp_path / "pricing.md"
+        doc.write_text("Our rates changed this year.", encoding="utf-8")
+
+        # A concurrent get_context caches the pre-upsert context mid-update
+        store = self.make_store()
+        store.index.during_upsert = lambda: store._cache_context(("rates", 3), "stale context")
+
+        assert store.add_document(doc) == 1
+        assert len(store._context_cache) == 0
+
+    def test_empty_document_still_clears(self, tmp_path):
+        doc = tmp_path / "pricing.md"
+        doc.write_text("   ", encoding="utf-8")
+
+        store = self.make_store()
+        assert store.add_document(doc) == 0
+        assert len(store._context_cache) == 0
@@ -0,0 +1,70 @@
+"""
+Tests for RAG retrieval helper functions.
+Run with: pytest tests/test_retrieval.py -v
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path so we can import from utils
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.retrieval import needs_retrieval
+
+
+# ============================================================
+# needs_retrieval tests
+# ============================================================
+
+class TestNeedsRetrieval:
+    """Tests for needs_retrieval function."""
+
+    # Small talk skips retrieval
+    def test_greeting(self):
+        assert needs_retrieval("hi") is False
+
+    def test_greeting_with_name(self):
+        assert needs_retrieval("Hello Maurice!") is False
+
+    def test_good_morning(self):
+        assert needs_retrieval("Good morning") is False
+
+    def test_thanks(self):
+        assert needs_retrieval("Thanks so much!") is False
+
+    def test_acknowledgement(self):
+        assert needs_retrieval("ok") is False
+
+    def test_yes(self):
+        assert needs_retrieval("Yep.") is False
+
+    def test_goodbye(self):
+        assert needs_retrieval("bye") is False
+
+    # Commands and empty input
+    def test_slash_command(self):
+        assert needs_retrieval("/stats") is False
+
+    def test_empty(self):
+        assert needs_retrieval("") is False
+
+    def test_whitespace(self):
+        assert needs_retrieval("   ") is False
+
+    # Real questions still retrieve
+    def test_question(self):
+        assert needs_retrieval("What projects have you done?") is True
+
+    def test_short_question(self):
+        assert needs_retrieval("Pricing?") is True
+
+    def test_greeting_then_question(self):
+        assert needs_retrieval("Hi, what services do you offer?") is True
+
+    def test_thanks_then_question(self):
+        assert needs_retrieval("Thanks! Do you work with Treasury?") is True
+
+    def test_word_starting_with_greeting(self):
+        assert needs_retrieval("history of Blacksky") is True
+
+    def test_no_prefix_word(self):
+        assert needs_retrieval("Node.js experience?") is True
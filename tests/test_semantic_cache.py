@@ -0,0 +1,122 @@
+"""
+Tests for the in-memory semantic cache used for RAG contexts.
+Run with: pytest tests/test_semantic_cache.py -v
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path so we can import from utils
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from utils import semantic_cache
+from utils.semantic_cache import SemanticCache, cosine_similarity, normalize
+
+
+# ============================================================
+# normalize / cosine_similarity tests
+# ============================================================
+
+class TestVectorHelpers:
+    """Tests for normalize and cosine_similarity functions."""
+
+    def test_normalize_unit_length(self):
+        vector = normalize([3.0, 4.0])
+        assert vector == [0.6, 0.8]
+
+    def test_normalize_zero_vector(self):
+        assert normalize([0.0, 0.0]) == [0.0, 0.0]
+
+    def test_identical_vectors(self):
+        v = normalize([1.0, 2.0, 3.0])
+        assert abs(cosine_similarity(v, v) - 1.0) < 1e-9
+
+    def test_orthogonal_vectors(self):
+        assert cosine_similarity([1.0, 0.0], [0.0, 1.0]) == 0.0
+
+
+@pytest.mark.skipif(semantic_cache.np is None, reason="NumPy not installed")
+class TestUnitArray:
+    """Tests for the NumPy normalization helper."""
+
+    def test_matches_normalize(self):
+        vector = [3.0, 4.0, 12.0]
+        assert semantic_cache._unit_array(vector).tolist() == pytest.approx(normalize(vector))
+
+    def test_zero_vector(self):
+        assert semantic_cache._unit_array([0.0, 0.0]).tolist() == [0.0, 0.0]
+
+
+# ============================================================
+# SemanticCache tests
+# ============================================================
+
+class TestSemanticCache:
+    """Tests for SemanticCache class."""
+
+    def test_exact_hit(self):
+        cache = SemanticCache()
+        cache.add([1.0, 0.0], "answer")
+        assert cache.lookup([1.0, 0.0]) == "answer"
+
+    def test_near_hit_ignores_magnitude(self):
+        cache = SemanticCache(threshold=0.9)
+        cache.add([1.0, 0.1], "answer")
+        assert cache.lookup([10.0, 1.2]) == "answer"
+
+    def test_miss_below_threshold(self):
+        cache = SemanticCache(threshold=0.9)
+        cache.add([1.0, 0.0], "answer")
+        assert cache.lookup([0.0, 1.0]) is None
+
+    def test_empty_cache(self):
+        assert SemanticCache().lookup([1.0, 0.0]) is None
+
+    def test_best_match_wins(self):
+        cache = SemanticCache(threshold=0.5)
+        cache.add([1.0, 0.5], "close")
+        cache.add([1.0, 0.05], "closest")
+        assert cache.lookup([1.0, 0.0]) == "closest"
+
+    def test_scope_must_match(self):
+        cache = SemanticCache()
+        cache.add([1.0, 0.0], "with docs", scope="context A")
+        assert cache.lookup([1.0, 0.0], scope="context B") is None
+        assert cache.lookup([1.0, 0.0], scope="context A") == "with docs"
+
+    def test_evicts_least_recently_used(self):
+        cache = SemanticCache(max_entries=2)
+        cache.add([1.0, 0.0], "a")
+        cache.add([0.0, 1.0], "b")
+        cache.lookup([1.0, 0.0])  # "a" becomes most recent
+        cache.add([-1.0, 0.0], "c")
+        assert len(cache) == 2
+        assert cache.lookup([0.0, 1.0]) is None
+        assert cache.lookup([1.0, 0.0]) == "a"
+
+    def test_clear(self):
+        cache = SemanticCache()
+        cache.add([1.0, 0.0], "answer")
+        cache.clear()
+        assert len(cache) == 0
+        assert cache.lookup([1.0, 0.0]) is None
+
+    def test_reuses_space_after_eviction(self):
+        cache = SemanticCache(max_entries=2)
+        for i in range(10):
+            cache.add([1.0, float(i)], i)
+        assert len(cache) == 2
+        assert cache.lookup([1.0, 9.0]) == 9
+        assert cache.lookup([1.0, 8.0]) == 8
+
+
+class TestSemanticCachePurePython(TestSemanticCache):
+    """Runs the SemanticCache tests without NumPy."""
+
+    @pytest.fixture(autouse=True)
+    def without_numpy(self, monkeypatch):
+        monkeypatch.setattr(semantic_cache, "np", None)
+
+    def test_uses_fallback(self):
+        assert SemanticCache()._use_numpy is False
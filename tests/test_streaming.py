@@ -0,0 +1,75 @@
+"""
+Tests for streaming helper functions.
+Run with: pytest tests/test_streaming.py -v
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path so we can import from utils
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.streaming import coalesce_tokens
+
+
+# Helper to create a fake clock that never advances
+def frozen_clock():
+    return 0.0
+
+
+def ticking_clock(step: float):
+    """Create a clock that advances by `step` seconds on every call."""
+    state = {"now": 0.0}
+
+    def clock():
+        state["now"] += step
+        return state["now"]
+
+    return clock
+
+
+# ============================================================
+# coalesce_tokens tests
+# ============================================================
+
+class TestCoalesceTokens:
+    """Tests for coalesce_tokens function."""
+
+    def test_preserves_text(self):
+        tokens = ["Hello", ",", " world", "!", " How", " are", " you", "?"]
+        chunks = list(coalesce_tokens(tokens, min_chars=8, clock=frozen_clock))
+        assert "".join(chunks) == "".join(tokens)
+
+    def test_groups_by_size(self):
+        tokens = ["ab", "cd", "ef", "gh", "ij"]
+        chunks = list(coalesce_tokens(tokens, min_chars=4, clock=frozen_clock))
+        assert chunks == ["abcd", "efgh", "ij"]
+
+    def test_flushes_tail(self):
+        chunks = list(coalesce_tokens(["a", "b"], min_chars=100, clock=frozen_clock))
+        assert chunks == ["ab"]
+
+    def test_flushes_on_delay(self):
+        # Every token arrives "late", so each one is flushed on its own
+        tokens = ["a", "b", "c"]
+        chunks = list(coalesce_tokens(tokens, min_chars=100, max_delay=0.01, clock=ticking_clock(0.02)))
+        assert chunks == ["a", "b", "c"]
+
+    def test_large_token_flushes_immediately(self):
+        chunks = list(coalesce_tokens(["x" * 50, "y"], min_chars=32, clock=frozen_clock))
+        assert chunks == ["x" * 50, "y"]
+
+    def test_skips_empty_tokens(self):
+        chunks = list(coalesce_tokens(["", "a", "", "b"], min_chars=100, clock=frozen_clock))
+        assert chunks == ["ab"]
+
+    def test_empty_stream(self):
+        assert list(coalesce_tokens([], clock=frozen_clock)) == []
+
+    def test_is_lazy(self):
+        # Chunks are produced while the source is still being consumed
+        def source():
+            yield "abcd"
+            raise RuntimeError("stream broke")
+
+        chunks = coalesce_tokens(source(), min_chars=4, clock=frozen_clock)
+        assert next(chunks) == "abcd"
@@ -0,0 +1,39 @@
+"""
+Pure helpers for deciding when the chatbot needs RAG retrieval.
+These have no external dependencies and are easily testable.
+"""
+import re
+
+# Small talk and acknowledgements that never need document context
+SMALL_TALK_PATTERN = re.compile(
+    r"^(?:hi|hey|hello|howdy|yo|sup|hiya|"
+    r"good (?:morning|afternoon|evening)|"
+    r"thanks|thank you|thx|ty|cheers|"
+    r"ok|okay|k|cool|great|nice|awesome|perfect|got it|sounds good|"
+    r"yes|yeah|yep|yup|sure|no|nope|nah|"
+    r"bye|goodbye|see you|later|lol|haha)"
+    r"(?:\s+(?:there|again|maurice|so much|a lot|you|too))*"
+    r"[\s!.,?]*$",
+    re.IGNORECASE
+)
+
+def needs_retrieval(message: str) -> bool:
+    """Return True if a user message should trigger a document search.
+
+    Greetings, thanks, short acknowledgements and slash commands are
+    answered from the system prompt alone, so skip the embedding call and
+    vector query for them.
+    """
+    text = message.strip()
+    if not text:
+        return False
+
+    # CLI-style commands (/stats, /clear, ...)
+    if text.startswith("/"):
+        return False
+
+    if SMALL_TALK_PATTERN.match(text):
+        return False
+
+    return True
+
@@ -0,0 +1,120 @@
+"""
+In-memory semantic cache: finds stored values by embedding similarity.
+Uses NumPy when available (it ships with the Together SDK and
+sentence-transformers) and falls back to pure Python, so it is easily testable.
+"""
+import math
+import operator
+import threading
+from collections import OrderedDict
+from typing import Hashable, List
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def normalize(vector: List[float]) -> List[float]:
+    """Scale a vector to unit length (zero vectors are returned unchanged)."""
+    norm = math.sqrt(sum(map(operator.mul, vector, vector)))
+    if norm == 0:
+        return list(vector)
+    return [x / norm for x in vector]
+
+
+def _unit_array(vector: List[float]):
+    """NumPy float32 unit vector (zero vectors are returned unchanged)."""
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.sqrt(array @ array)
+    if norm == 0:
+        return array
+    return array / norm
+
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    """Cosine similarity of two already-normalized vectors."""
+    return sum(map(operator.mul, a, b))
+
+
+class SemanticCache:
+    """Bounded LRU cache looked up by nearest embedding.
+
+    Each entry also stores a `scope` (any hashable, e.g. the top_k a RAG
+    context was retrieved with). A lookup only matches entries with the
+    same scope and a cosine similarity of at least `threshold`.
+
+    With NumPy, embeddings are kept as rows of one preallocated matrix and a
+    lookup scores every entry with a single matrix-vector product.
+    """
+
+    def __init__(self, max_entries: int = 128, threshold: float = 0.92):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        # key -> (matrix row with NumPy / normalized embedding without, scope, value)
+        self._entries = OrderedDict()
+        self._next_key = 0
+        self._lock = threading.Lock()
+        self._use_numpy = np is not None
+        self._matrix = None  # (max_entries, dim) float32, allocated on first add
+        self._free_rows = list(range(max_entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, embedding: List[float], scope: Hashable = None):
+        """Return the most similar cached value, or None if nothing is close enough."""
+        query = _unit_array(embedding) if self._use_numpy else normalize(embedding)
+        with self._lock:
+            if not self._entries:
+                return None
+
+            if self._use_numpy:
+                scores = self._matrix @ query
+                candidates = (
+                    (key, scores[row])
+                    for key, (row, entry_scope, _) in self._entries.items()
+                    if entry_scope == scope
+                )
+            else:
+                candidates = (
+                    (key, cosine_similarity(query, vector))
+                    for key, (vector, entry_scope, _) in self._entries.items()
+                    if entry_scope == scope
+                )
+
+            best_key, best_score = None, self.threshold
+            for key, score in candidates:
+                if score >= best_score:
+                    best_key, best_score = key, score
+
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            return self._entries[best_key][2]
+
+    def add(self, embedding: List[float], value, scope: Hashable = None) -> None:
+        """Store a value under an embedding, evicting the least recently used entry."""
+        vector = _unit_array(embedding) if self._use_numpy else normalize(embedding)
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                _, (stored, _, _) = self._entries.popitem(last=False)
+                if self._use_numpy:
+                    self._free_rows.append(stored)
+
+            if self._use_numpy:
+                if self._matrix is None:
+                    self._matrix = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+                stored = self._free_rows.pop()
+                self._matrix[stored] = vector
+            else:
+                stored = vector
+
+            self._entries[self._next_key] = (stored, scope, value)
+            self._next_key += 1
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+            self._free_rows = list(range(self.max_entries))
@@ -0,0 +1,35 @@
+"""
+Pure helpers for shaping streamed model output.
+These have no external dependencies and are easily testable.
+"""
+import time
+from typing import Callable, Iterable, Iterator
+
+
+def coalesce_tokens(tokens: Iterable[str], min_chars: int = 32, max_delay: float = 0.025,
+                    clock: Callable[[], float] = time.monotonic) -> Iterator[str]:
+    """Group streamed tokens into larger chunks.
+
+    Buffers tokens and yields them joined once the buffer holds at least
+    min_chars characters or max_delay seconds have passed since the last
+    flush. Whatever is left is yielded when the token stream ends.
+    """
+    buffer = []
+    buffered_chars = 0
+    last_flush = clock()
+
+    for token in tokens:
+        if not token:
+            continue
+        buffer.append(token)
+        buffered_chars += len(token)
+
+        now = clock()
+        if buffered_chars >= min_chars or now - last_flush >= max_delay:
+            yield "".join(buffer)
+            buffer.clear()
+            buffered_chars = 0
+            last_flush = now
+
+    if buffer:
+        yield "".join(buffer)